@@ -1,9 +1,76 @@
+from concurrent.futures import ThreadPoolExecutor
 from functools import wraps
+import atexit
 import sys
 import os
+import threading
+import time
 from datetime import datetime
 import logging
+import logging.handlers
+import queue
 import requests
+from requests.adapters import HTTPAdapter
+
+_DRY_RUN_MAP = {'True': True, 'False': False}
+_TS_FMT = '%Y-%m-%d_%H:%M:%S'
+
+class BatchedFileHandler(logging.FileHandler):
+    """ A FileHandler that flushes once per `flush_every` records, or
+    `flush_seconds` after a record was buffered, instead of once per
+    record. Records at `flush_level` or above flush immediately, so a
+    crash can't silently eat an error. """
+
+    def __init__(self, filename, flush_every=256, flush_seconds=1.0,
+                 flush_level=logging.ERROR, **kwargs):
+        self._flush_every = flush_every
+        self._flush_seconds = flush_seconds
+        self._flush_level = flush_level
+        self._pending = 0
+        self._flush_timer = None
+        logging.FileHandler.__init__(self, filename, **kwargs)
+
+    def _open(self):
+        # A 64 KiB stream buffer lets writes coalesce instead of
+        # hitting the OS once per record.
+        return open(self.baseFilename, self.mode, buffering=65536,
+                    encoding=self.encoding, errors=self.errors)
+
+    def emit(self, record):
+        # Write the record but defer the per-record flush that
+        # StreamHandler.emit would do, flushing once per batch. A
+        # timer bounds how long a buffered record can sit if no
+        # further records arrive.
+        try:
+            if self.stream is None:
+                self.stream = self._open()
+            self.stream.write(self.format(record) + self.terminator)
+            self._pending += 1
+            if self._pending >= self._flush_every or record.levelno >= self._flush_level:
+                self.flush()
+            elif self._flush_timer is None:
+                timer = threading.Timer(self._flush_seconds, self.flush)
+                timer.daemon = True
+                self._flush_timer = timer
+                timer.start()
+        except RecursionError:
+            raise
+        except Exception:
+            self.handleError(record)
+
+    def flush(self):
+        # A real flush, so explicit callers (logging.shutdown, close)
+        # can always force buffered records to disk.
+        self.acquire()
+        try:
+            timer = self._flush_timer
+            if timer is not None:
+                self._flush_timer = None
+                timer.cancel()
+            self._pending = 0
+            logging.FileHandler.flush(self)
+        finally:
+            self.release()
 
 class TinyETL:
     """Manages facts about an ETL Process.
@@ -41,10 +108,14 @@ class TinyETL:
     =============
 
     This also provides a decorator for any tasks you want to log. 
-    Apply `@etl.log` as the innermost decorator to a task and it 
+    Apply `@etl.log` as the innermost decorator to a task and it
     will be logged.
     """
 
+    __slots__ = ('name', 'long_desc', 'dry_run', 'log_dir', 'tmpdata_dir',
+                 'logname', 'logfile', '_logger', '_extra', '_session',
+                 '_log_listener', '_log_info', '_log_error', '_log_exc')
+
     def __init__(self, name, long_desc, env, log_dir, tmpdata_dir, **kwargs):
         """
         name [str] -> Short name to ETL task. Used in creating logfile names.
@@ -53,7 +124,12 @@ class TinyETL:
         log_dir [str] -> Absolute path to the directory to store logs in.
         tmpdata_dir [str] ->  Absolute path to the directory to store temp data in.
         """
-        # If there are no tasks to be run at invocation, 
+        # This allows the user to store relevant data on the
+        # object they've created, without needing to anticipate
+        # every possible type of value a user may want to store.
+        self._extra = dict(kwargs)
+
+        # If there are no tasks to be run at invocation,
         # don't bother with the rest of the object __init__
         if env.tasks == []:
             return
@@ -64,15 +140,40 @@ class TinyETL:
         self.log_dir = log_dir
         self.tmpdata_dir = tmpdata_dir
 
-        if not self.dry_run:
-            self.logname = "{}_{}".format(self.name, datetime.now().strftime('%Y-%m-%d_%H:%M:%S')) 
-            self.logfile = os.path.join(self.log_dir, self.logname + '.log')
-            self.logger = self._create_logger()
+        # One pooled session for all downloads, so repeated requests
+        # to the same host reuse their TCP/TLS connections.
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=16, pool_maxsize=16)
+        self._session.mount('https://', adapter)
+        self._session.mount('http://', adapter)
 
-        # This allows the user to store relevant data on the
-        # object they've created, without needing to anticipate
-        # every possible type of value a user may want to store.
-        self.__dict__.update(kwargs)
+        # Built lazily on first use (see the logger property), so
+        # dry runs and introspection-only invocations never open a
+        # logfile.
+        self._logger = None
+
+    def __setattr__(self, attr, value):
+        # Slot names assign normally; anything else is a user-defined
+        # runtime attribute and lives in _extra, matching __getattr__.
+        if attr in TinyETL.__slots__:
+            object.__setattr__(self, attr, value)
+        else:
+            self._extra[attr] = value
+
+    def __getattr__(self, attr):
+        # Only reached when normal (slotted) lookup fails; serve
+        # user-defined attributes out of _extra.
+        if attr == '_extra':
+            raise AttributeError(attr)
+        if attr in ('_log_info', '_log_error', '_log_exc'):
+            # First use of a bound log method; building the logger
+            # binds all three.
+            self.logger
+            return object.__getattribute__(self, attr)
+        try:
+            return self._extra[attr]
+        except KeyError:
+            raise AttributeError(attr)
 
     def usage(self):
         msg = "Please provide either 'True' or 'False' to dry_run.\n"
@@ -81,56 +182,145 @@ class TinyETL:
 
     def _this_is_a_dry_run(self, env):
         """ Determines if this is a dry run. """
-        try:
-            dry_run = env.dry_run
-        except AttributeError:
+        # Convert the passed-in string val to a bool before returning
+        dry_run = _DRY_RUN_MAP.get(getattr(env, 'dry_run', None))
+        if dry_run is None:
             self.usage()
+        return dry_run
 
-        if dry_run not in ('True', 'False'):
-            self.usage()
-        else:
-            # Convert the passed-in string val to a bool before returning
-            return {'True': True, 'False': False}.get(dry_run)
+    @property
+    def logger(self):
+        if self._logger is None:
+            self.logname = "{}_{}".format(self.name, datetime.now().strftime(_TS_FMT))
+            self.logfile = os.path.join(self.log_dir, self.logname + '.log')
+            self._logger = self._create_logger()
+            # Bind the frequently-called log methods once, so hot
+            # call sites skip the two attribute lookups per call.
+            self._log_info = self._logger.info
+            self._log_error = self._logger.error
+            self._log_exc = self._logger.exception
+        return self._logger
 
     def _create_logger(self):
         # See https://wingware.com/psupport/python-manual/2.3/lib/node304.html
         logger = logging.getLogger(self.name)
-        hdlr = logging.FileHandler(self.logfile)
+        # Named loggers are process-wide singletons: a second TinyETL
+        # with the same name (or a fabfile re-import) would stack a
+        # second handler and double every log line on disk.
+        if logger.handlers:
+            return logger
+        # Keep records out of the root logger so Fabric's own handler
+        # doesn't write them a second time.
+        logger.propagate = False
+        # The handler batches flushes for cheap INFO traffic but pushes
+        # ERRORs straight to disk, so a crash can't lose an error record.
+        hdlr = BatchedFileHandler(self.logfile)
         formatter = logging.Formatter('%(asctime)s %(levelname)s %(message)s')
         hdlr.setFormatter(formatter)
-        logger.addHandler(hdlr) 
+        # Hand records off to a background thread via a queue, so a
+        # task's call to logger.info returns as soon as the record is
+        # enqueued -- slow disks no longer block task execution.
+        log_queue = queue.Queue(-1)
+        logger.addHandler(logging.handlers.QueueHandler(log_queue))
         logger.setLevel(logging.DEBUG)
+        self._log_listener = logging.handlers.QueueListener(
+            log_queue, hdlr, respect_handler_level=True
+        )
+        self._log_listener.start()
+        atexit.register(self.close)
         return logger
 
+    def close(self):
+        """ Closes the download session and stops the background log
+        listener, flushing any pending records. """
+        session = getattr(self, '_session', None)
+        if session is not None:
+            self._session = None
+            session.close()
+
+        listener = getattr(self, '_log_listener', None)
+        if listener is not None:
+            self._log_listener = None
+            # Detach the QueueHandler from the process-wide named
+            # logger; otherwise a later TinyETL with the same name
+            # would see logger.handlers populated, skip its own setup,
+            # and log into a queue nobody drains.
+            logger = getattr(self, '_logger', None)
+            if logger is not None:
+                for handler in list(logger.handlers):
+                    logger.removeHandler(handler)
+                self._logger = None
+                for attr in ('_log_info', '_log_error', '_log_exc'):
+                    try:
+                        object.__delattr__(self, attr)
+                    except AttributeError:
+                        pass
+            listener.stop()
+            for handler in listener.handlers:
+                handler.close()
+
     def log(self, f):
-        @wraps(f)
-        def logwrapper(*args, **kwargs):
-            if self.dry_run:
-                print('[DRY RUN] :: {}()'.format(f.__name__))
-            else:
-                current_info = "Running {}".format(f.__name__)
+        # Resolve the dry-run branch and build the messages once at
+        # decoration time, so the wrapper that runs on every call does
+        # no attribute lookups or string formatting of its own.
+        dry_run = getattr(self, 'dry_run', None)
+
+        if dry_run is None:
+            # __init__ bailed early (no tasks to run, e.g. `fab --list`),
+            # so the task will never actually be invoked.
+            return f
+
+        if dry_run:
+            dry_run_msg = '[DRY RUN] :: {}()'.format(f.__name__)
+
+            @wraps(f)
+            def logwrapper(*args, **kwargs):
+                print(dry_run_msg)
+        else:
+            current_info = "Running {}".format(f.__name__)
+            log_info = self._log_info
+            log_exception = self._log_exc
+
+            @wraps(f)
+            def logwrapper(*args, **kwargs):
                 print(current_info)
-                self.logger.info(current_info)
+                log_info(current_info)
 
                 try:
                     return f(*args, **kwargs)
                 except Exception:
-                    self.logger.exception("ETL Error")
+                    # exception() appends the traceback itself; just
+                    # name the task and let %-formatting defer the
+                    # string build to the handler.
+                    log_exception("Task %s failed", f.__name__)
                     raise
 
         return logwrapper
     
     def timestamp(self):
-        return datetime.now().strftime('%Y-%m-%d_%H:%M:%S')
+        # time.strftime skips the datetime object allocation, which
+        # matters for callers that timestamp every record.
+        return time.strftime(_TS_FMT)
 
     def download_file(self, endpoint, file_to_write_to):
-        r = requests.get(endpoint)
+        # Stream the response straight to disk rather than holding
+        # the whole body in memory -- keeps memory use constant no
+        # matter how large the file is.
+        with self._session.get(endpoint, stream=True) as r:
+            if r.status_code != 200:
+                self._log_error("Attempt to download {} failed with code {}.".format(endpoint, r.status_code))
+            else:
+                # iter_content decodes any Content-Encoding (gzip,
+                # deflate) as it streams; reading r.raw would write
+                # the compressed wire bytes to disk.
+                with open(file_to_write_to, "wb") as f:
+                    for chunk in r.iter_content(chunk_size=1024*1024):
+                        f.write(chunk)
 
-        if r.status_code != 200:
-            self.logger.error("Attempt to download {} failed with code {}.".format(endpoint, r.status_code))
-        else:   
-            with open(file_to_write_to, "wb") as f:
-                f.write(r.content)
+    def download_files(self, pairs, max_workers=8):
+        """ Downloads a list of (endpoint, file_to_write_to) pairs concurrently. """
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            list(executor.map(lambda pair: self.download_file(*pair), pairs))
 
     def __str__(self):
         info = """
@@ -144,16 +334,10 @@ Log location: {}
 Temp data location: {}
         """.format(self.name, self.long_desc, self.log_dir, self.tmpdata_dir)
 
-        standard = ('name', 'long_desc', 'log_dir', 'tmpdata_dir', 'logger', 'dry_run')
+        if not self._extra:
+            return info
 
-        user_defined_attrs = ""
-        for k, v in self.__dict__.iteritems():
-            if k not in standard:
-                user_defined_attrs += "{}: {}\n".format(k.title(), v)
-
-        if user_defined_attrs == "":
-            return info 
-        else:
-            user_defined_attrs = "\nUser-defined Attributes:\n" + "=======================\n\n" + user_defined_attrs
-            return info + user_defined_attrs
+        parts = ["{}: {}".format(k.title(), v) for k, v in self._extra.items()]
+        user_defined_attrs = "\nUser-defined Attributes:\n" + "=======================\n\n" + "\n".join(parts) + "\n"
+        return info + user_defined_attrs
 